@@ -48,9 +48,9 @@ def read_data(fit_file: str, x_axis: str, y_axis: list[str], y_axis_right: list[
     ypoints: dict[str, list] = {y: [] for y in y_axis}
     ypoints_right: dict[str, list] = {y: [] for y in y_axis_right}
 
-    for timestamp,record in sorted(reader.data):
+    for timestamp,record in reader.data:
         if x_axis not in record:
-            logging.warning(f"X-axis field '{x_axis}' not found in record at {timestamp}. Skipping.")
+            logging.warning("X-axis field '%s' not found in record at %s. Skipping.", x_axis, timestamp)
             continue
 
         xpoints.append(record[x_axis])
@@ -58,7 +58,7 @@ def read_data(fit_file: str, x_axis: str, y_axis: list[str], y_axis_right: list[
         for y in y_axis:
             factor = conversion_factors.get(y, 1)
             if y not in record:
-                logging.debug(f"Y-axis field '{y}' not found in record at {timestamp}. Appending None.")
+                logging.debug("Y-axis field '%s' not found in record at %s. Appending None.", y, timestamp)
                 ypoints[y].append(None)
             else:
                 ypoints[y].append(record[y] * factor)
@@ -66,7 +66,7 @@ def read_data(fit_file: str, x_axis: str, y_axis: list[str], y_axis_right: list[
         for y in y_axis_right:
             factor = conversion_factors.get(y, 1)
             if y not in record:
-                logging.debug(f"Y-axis right field '{y}' not found in record at {timestamp}. Appending None.")
+                logging.debug("Y-axis right field '%s' not found in record at %s. Appending None.", y, timestamp)
                 ypoints_right[y].append(None)
             else:
                 ypoints_right[y].append(record[y] * factor)
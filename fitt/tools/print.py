@@ -10,11 +10,12 @@ def main(fit_file: str) -> bool:
     logging.info(f"Printing fit file: {fit_file}")
 
     messages: dict[str, dict] = {}
+    mesg_num_names: dict[int, str] = {int(num): name for num, name in Profile['types']['mesg_num'].items() if num.isdigit()} # type: ignore
 
     print()
     def mesg_listener(mesg_num: int, message: dict) -> None:
         print("----------")
-        message_name = Profile['types']['mesg_num'].get(str(mesg_num)) # type: ignore
+        message_name = mesg_num_names.get(mesg_num)
         print(f"Message: {message_name if message_name is not None else 'unknown'} ({mesg_num})")
         print(message)
 
@@ -24,8 +25,7 @@ def main(fit_file: str) -> bool:
                 'count': 0,
                 'fields': set()
             }
-        for field in message:
-            messages[mkey]['fields'].add(field)
+        messages[mkey]['fields'].update(message)
         messages[mkey]['count'] += 1
 
     try:
@@ -0,0 +1,189 @@
+import math
+import numpy as np
+
+from typing import Any, Callable, TypeVar, cast
+
+from .geo import grados_radianes, radio_terrestre
+
+try:
+    from numba import njit, prange
+    JIT_AVAILABLE = True
+except ImportError: # numba is optional - kernels run as plain python without it
+    prange = range # type: ignore[misc, unused-ignore]
+    JIT_AVAILABLE = False
+
+
+F = TypeVar('F', bound=Callable[..., Any])
+
+
+def jit(**options: Any) -> Callable[[F], F]:
+    def decorator(func: F) -> F:
+        if not JIT_AVAILABLE:
+            return func
+        return cast(F, njit(cache=True, **options)(func))
+    return decorator
+
+
+def _haversine_segments_numpy(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    dlat = np.diff(lat)
+    dlon = np.diff(lon)
+
+    haversine = (np.sin(dlat/2.0) ** 2) + (np.cos(lat[:-1]) * np.cos(lat[1:]) * (np.sin(dlon/2.0) ** 2))
+    segments: np.ndarray = 2 * np.arcsin(np.minimum(1.0, np.sqrt(haversine))) * radio_terrestre
+    return segments
+
+
+@jit(parallel=True, fastmath=True)
+def _haversine_segments_jit(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    out = np.zeros(max(len(lat) - 1, 0), dtype=np.float64)
+
+    for i in prange(len(out)):
+        haversine = (math.sin((lat[i + 1] - lat[i])/2.0) ** 2) + (math.cos(lat[i]) * math.cos(lat[i + 1]) * (math.sin((lon[i + 1] - lon[i])/2.0) ** 2))
+        out[i] = 2 * math.asin(min(1.0, math.sqrt(haversine))) * radio_terrestre
+
+    return out
+
+
+haversine_segments = _haversine_segments_jit if JIT_AVAILABLE else _haversine_segments_numpy
+
+
+def track_distance(lat: np.ndarray, lon: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    segments = haversine_segments(lat[valid] * grados_radianes, lon[valid] * grados_radianes)
+    total_distance = np.concatenate((np.zeros(1), np.cumsum(segments)))
+
+    # records without position keep distance of last known position
+    last_position = np.cumsum(valid) - 1
+    return np.where(last_position >= 0, total_distance[np.maximum(last_position, 0)], 0.0)
+
+
+def rate_of_change(time: np.ndarray, values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # change since previous sample per second - first sample and samples without time delta have no rate
+    rate = np.zeros(len(time), dtype=np.float64)
+    rate_valid = np.zeros(len(time), dtype=np.bool_)
+
+    time_delta = np.diff(time)
+    rate_valid[1:] = time_delta > 0
+    np.divide(np.diff(values), time_delta, out=rate[1:], where=rate_valid[1:])
+    return rate, rate_valid
+
+
+def speeds(time: np.ndarray, distance: np.ndarray,
+           altitude: np.ndarray, altitude_valid: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    speed, speed_valid = rate_of_change(time, distance)
+
+    # vertical speed between consecutive records with altitude
+    samples = np.flatnonzero(altitude_valid)
+    vertical_speed = np.zeros(len(time), dtype=np.float64)
+    vertical_speed_valid = np.zeros(len(time), dtype=np.bool_)
+    vertical_speed[samples], vertical_speed_valid[samples] = rate_of_change(time[samples], altitude[samples])
+
+    return speed, speed_valid, vertical_speed, vertical_speed_valid
+
+
+def centered_window_bounds(keys: np.ndarray, window_size: float) -> tuple[np.ndarray, np.ndarray]:
+    # same bounds as window_bounds for monotonic keys present in every record
+    half_window = window_size / 2.0
+    lo = np.searchsorted(keys, keys - half_window, side='left')
+    hi = np.searchsorted(keys, keys + half_window, side='right')
+
+    # keys -/+ half_window can round across a key exactly on window edge - settle edges on key deltas
+    count = len(keys)
+    while True:
+        extend_lo = (lo > 0) & (keys - keys[np.maximum(lo - 1, 0)] <= half_window)
+        shrink_lo = keys - keys[lo] > half_window
+        extend_hi = (hi < count) & (keys[np.minimum(hi, count - 1)] - keys <= half_window)
+        shrink_hi = keys[hi - 1] - keys > half_window
+        if not (extend_lo.any() or shrink_lo.any() or extend_hi.any() or shrink_hi.any()):
+            return lo, hi
+
+        lo = lo - extend_lo + shrink_lo
+        hi = hi + extend_hi - shrink_hi
+
+
+@jit()
+def window_bounds(keys: np.ndarray, valid: np.ndarray, window_size: float) -> tuple[np.ndarray, np.ndarray]:
+    count = len(keys)
+    lo = np.zeros(count, dtype=np.int64)
+    hi = np.zeros(count, dtype=np.int64)
+    half_window = window_size / 2.0
+
+    # window expands outwards from record until key of next record is out of window or missing
+    # (keys need not be monotonic - e.g. distance with gaps filled by track distance)
+    for i in range(count):
+        if not valid[i]:
+            continue
+
+        j = i
+        while j > 0 and valid[j - 1] and abs(keys[j - 1] - keys[i]) <= half_window:
+            j -= 1
+        k = i + 1
+        while k < count and valid[k] and abs(keys[k] - keys[i]) <= half_window:
+            k += 1
+
+        lo[i] = j
+        hi[i] = k
+
+    return lo, hi
+
+
+def window_mean(values: np.ndarray, valid: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # windows span a few samples - summed directly, offset by offset, relative to first sample
+    # (differences of running totals over whole activity would add rounding noise growing with its length)
+    reference = values[valid][0] if valid.any() else 0.0
+    total = np.zeros(len(lo), dtype=np.float64)
+    window_count = np.zeros(len(lo), dtype=np.int64)
+
+    last = len(values) - 1
+    for offset in range(int((hi - lo).max(initial=0))):
+        index = np.minimum(lo + offset, last)
+        take = (lo + offset < hi) & valid[index]
+        total += np.where(take, values[index] - reference, 0.0)
+        window_count += take
+
+    return reference + total / np.maximum(window_count, 1), window_count > 0
+
+
+def rolling_means(time: np.ndarray, values: np.ndarray, valid: np.ndarray,
+                  windows: tuple[float, ...]) -> list[tuple[np.ndarray, np.ndarray]]:
+    # mean of samples within (time - window, time] for every record, for every window
+    sample_time = time[valid]
+    samples = values[valid]
+
+    # integer running totals are exact, float ones are kept small relative to first sample
+    reference = samples[0] if samples.dtype.kind == 'f' and len(samples) > 0 else 0
+    total = np.concatenate((np.zeros(1, dtype=samples.dtype), np.cumsum(samples - reference)))
+    hi = np.searchsorted(sample_time, time, side='right')
+
+    means = []
+    for window in windows:
+        lo = np.searchsorted(sample_time, time - window, side='right')
+        window_count = hi - lo
+        means.append((reference + (total[hi] - total[lo]) / np.maximum(window_count, 1), window_count > 0))
+    return means
+
+
+def grade(distance: np.ndarray, altitude: np.ndarray, valid: np.ndarray,
+          lo: np.ndarray, hi: np.ndarray, min_window: float) -> tuple[np.ndarray, np.ndarray]:
+    count = len(distance)
+    index = np.arange(count)
+
+    # window edges snapped inwards to nearest record with both distance and altitude
+    # (always found for valid records, clamped in range for the rest which are masked out below)
+    next_valid = np.minimum.accumulate(np.where(valid, index, count)[::-1])[::-1]
+    prev_valid = np.maximum.accumulate(np.where(valid, index, -1))
+    first = np.minimum(next_valid[np.minimum(lo, count - 1)], count - 1)
+    last = np.maximum(prev_valid[np.maximum(hi - 1, 0)], 0)
+
+    # don't calculate grade for windows covering beginning or end of activity
+    out_valid = valid & (distance - distance[first] >= min_window/2) & (distance[last] - distance >= min_window/2)
+
+    z = distance[last[out_valid]] - distance[first[out_valid]]
+    y = altitude[last[out_valid]] - altitude[first[out_valid]]
+
+    x = np.sqrt(np.maximum(z*z - y*y, 0.0)) # pythagoras (x**2 + y**2 = z**2 where z is distance delta and y is altitude delta)
+
+    # altitude delta not smaller than distance delta (noisy data) has no defined grade
+    out_valid[out_valid] = x > 0
+    out = np.zeros(count, dtype=np.float64)
+    out[out_valid] = (y[x > 0] / x[x > 0]) * 100.0
+    return out, out_valid
@@ -0,0 +1,10 @@
+from garmin_fit_sdk import Decoder
+from typing import Callable
+
+
+def decode(decoder: Decoder, mesg_listener: Callable[[int, dict], None]|None = None, convert_datetimes: bool = True) -> list:
+    # decodes the fit file and returns decoding errors
+    # messages are passed to mesg_listener if given - without it the file is only validated
+    # convert_datetimes=False leaves date_time fields as raw fit timestamps (seconds since fit epoch)
+    _, errors = decoder.read(mesg_listener=mesg_listener, convert_datetimes_to_dates=convert_datetimes)
+    return list(errors)
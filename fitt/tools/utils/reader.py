@@ -1,19 +1,31 @@
+import bisect
 import logging
 import math
 import numpy as np
-import statistics
 import time
-from datetime import datetime, timedelta
+from datetime import datetime
 from garmin_fit_sdk import Decoder, Stream, Profile
-from typing import Generator
+from garmin_fit_sdk.util import convert_timestamp_to_datetime
+from typing import Callable, Generator, cast
 
-from .geo import geo_distance
+from .decode import decode
+
+# calculation kernels (._kernels) are imported where used - importing numba is slow and not every tool does calculations
 
 
 SEMICIRCLES_FACTOR = 180.0 / 2**31
 SMOOTH_ALTITUDE_TIME_WINDOW = 5 # seconds
 MAX_GRADE_WINDOW = 50 # meters
 MIN_GRADE_WINDOW = 20 # meters
+SPARSE_COLUMN_RATIO = 0.1 # columns populated in fewer rows are iterated by row index
+
+MESG_NUM_SESSION = Profile['mesg_num']['SESSION'] # type: ignore
+MESG_NUM_SPORT = Profile['mesg_num']['SPORT'] # type: ignore
+MESG_NUM_FILE_ID = Profile['mesg_num']['FILE_ID'] # type: ignore
+MESG_NUM_RECORD = Profile['mesg_num']['RECORD'] # type: ignore
+MESG_NUM_EVENT = Profile['mesg_num']['EVENT'] # type: ignore
+MESG_NUM_CLIMB_PRO = Profile['mesg_num']['CLIMB_PRO'] # type: ignore
+MESG_NUM_JUMP = Profile['mesg_num']['JUMP'] # type: ignore
 
 
 units = {
@@ -115,6 +127,90 @@ meta_units = {
     'activity_name':                    None,
 }
 
+record_fields = (
+    'position_lat', # semicircles, converted to degrees after decoding
+    'position_long', # semicircles, converted to degrees after decoding
+    'heart_rate',
+    'cadence',
+    'distance',
+    'power',
+    'grade',
+    'temperature',
+    'accumulated_power',
+    'left_right_balance',
+    'gps_accuracy',
+    'vertical_speed',
+    'calories',
+    'left_torque_effectiveness',
+    'right_torque_effectiveness',
+    'left_pedal_smoothness',
+    'right_pedal_smoothness',
+    'combined_pedal_smoothness',
+    'grit',
+    'flow',
+    'core_temperature',
+)
+
+record_fallback_fields = (
+    ('altitude',                        ('enhanced_altitude', 'altitude')),
+    ('speed',                           ('enhanced_speed', 'speed')),
+    ('respiration_rate',                ('enhanced_respiration_rate',)),
+)
+
+semicircles_fields = (
+    'position_lat',
+    'position_long',
+)
+
+column_dtypes: dict[str, type[np.integer]] = {
+    'heart_rate':                       np.uint8,
+    'cadence':                          np.uint8,
+    'power':                            np.uint16,
+    'accumulated_power':                np.uint32,
+    'temperature':                      np.int8,
+    'left_right_balance':               np.uint8,
+    'gps_accuracy':                     np.uint8,
+    'calories':                         np.uint16,
+    'front_gear_num':                   np.uint8,
+    'front_gear':                       np.uint8,
+    'rear_gear_num':                    np.uint8,
+    'rear_gear':                        np.uint8,
+    'active_climb':                     np.uint32,
+}
+
+
+record_columns = ('timestamp',) + record_fields + tuple(field for field, _ in record_fallback_fields)
+
+
+def _compile_record_fields_stage() -> Callable[[dict, int, dict], None]:
+    # generates straight-line staging of record fields into (rows, values) lists, e.g.:
+    #   if (value := get('heart_rate')) is not None:
+    #       rows, values = columns['heart_rate']
+    #       rows.append(row)
+    #       values.append(value)
+    lines = [
+        "def stage_record_fields(message, row, columns):",
+        "    get = message.get",
+    ]
+    for field in record_fields:
+        lines.append(f"    if (value := get({field!r})) is not None:")
+        lines.append(f"        rows, values = columns[{field!r}]")
+        lines.append("        rows.append(row)")
+        lines.append("        values.append(value)")
+    for field, sources in record_fallback_fields:
+        for i, source in enumerate(sources):
+            lines.append(f"    {'if' if i == 0 else 'elif'} (value := get({source!r})) is not None:")
+            lines.append(f"        rows, values = columns[{field!r}]")
+            lines.append("        rows.append(row)")
+            lines.append("        values.append(value)")
+
+    namespace: dict = {}
+    exec(compile("\n".join(lines), "<stage_record_fields>", "exec"), namespace)
+    return cast(Callable[[dict, int, dict], None], namespace['stage_record_fields'])
+
+
+stage_record_fields = _compile_record_fields_stage()
+
 
 def generate_name(sport: str|None, sub_sport: str|None, sport_profile_name: str|None) -> str:
     name = ""
@@ -136,19 +232,53 @@ def generate_name(sport: str|None, sub_sport: str|None, sport_profile_name: str|
 class Reader:
     def __init__(self, fit_file: str):
         self.fit_file: str = fit_file
-        self._data: dict[datetime, dict] = {}
+        self._rows: dict[int, int] = {} # decoding stage only - row of every fit timestamp in arrival order
+        self._staged: dict[str, tuple[list[int], list]] = {field: ([], []) for field in record_columns} # decoding stage only - (rows, values) of every field
+        self._timestamps: np.ndarray = np.zeros(0, dtype=np.int64) # fit timestamps (seconds since fit epoch) of all rows
+        self._cols: dict[str, np.ndarray] = {}
+        self._valid: dict[str, np.ndarray] = {}
         self._metadata: dict = {}
         self._cache: dict = {}
+        self._changes: list[tuple[int, dict]] = [] # state changes (gears, climbs) forward filled into records
+        self._climb_backfills: list[tuple[int, int]] = [] # climbs active from activity start until timestamp
 
         self.ok: bool = self._load_fit_file()
         if self.ok:
+            self._build_columns()
             self._generate_calculated_fields()
 
 
     @property
     def data(self) -> Generator[tuple[datetime, dict], None, None]:
-        for timestamp in sorted(self._data.keys()):
-            yield timestamp, self._data[timestamp]
+        # timestamps are kept as fit timestamps internally - converted only here
+        timestamps = [convert_timestamp_to_datetime(timestamp) for timestamp in self._timestamps.tolist()]
+        count = len(timestamps)
+
+        # complete columns need no validity check, rarely populated ones are visited only on their rows
+        complete: list[tuple[str, list]] = []
+        partial: list[tuple[str, list, list]] = []
+        sparse: dict[int, list[tuple[str, object]]] = {}
+        for field in self._cols:
+            values = timestamps if field == 'timestamp' else self._cols[field].tolist()
+            mask = self._valid[field]
+            populated = np.count_nonzero(mask)
+
+            if populated == count:
+                complete.append((field, values))
+            elif populated >= count * SPARSE_COLUMN_RATIO:
+                partial.append((field, values, mask.tolist()))
+            else:
+                for i in np.flatnonzero(mask).tolist():
+                    sparse.setdefault(i, []).append((field, values[i]))
+
+        for i, timestamp in enumerate(timestamps):
+            record = {field: values[i] for field, values in complete}
+            for field, values, valid in partial:
+                if valid[i]:
+                    record[field] = values[i]
+            for field, value in sparse.get(i, ()):
+                record[field] = value
+            yield timestamp, record
 
 
     @property
@@ -157,21 +287,14 @@ class Reader:
 
 
     def _load_fit_file(self) -> bool:
-        def mesg_listener(mesg_num: int, message: dict) -> None:
-            if mesg_num == Profile['mesg_num']['SESSION']: # type: ignore
-                self._handle_session_message(message)
-            elif mesg_num == Profile['mesg_num']['SPORT']: # type: ignore
-                self._handle_sport_message(message)
-            elif mesg_num == Profile['mesg_num']['FILE_ID']: # type: ignore
-                self._handle_file_id_message(message)
-            elif mesg_num == Profile['mesg_num']['RECORD']: # type: ignore
-                self._handle_record_message(message)
-            elif mesg_num == Profile['mesg_num']['EVENT']: # type: ignore
-                self._handle_event_message(message)
-            elif mesg_num == Profile['mesg_num']['CLIMB_PRO']: # type: ignore
-                self._handle_climb_message(message)
-            elif mesg_num == Profile['mesg_num']['JUMP']: # type: ignore
-                self._handle_jump_message(message)
+        handlers: dict[int, Callable[[dict], None]] = {
+            MESG_NUM_SESSION: self._handle_session_message,
+            MESG_NUM_SPORT: self._handle_sport_message,
+            MESG_NUM_FILE_ID: self._handle_file_id_message,
+            MESG_NUM_RECORD: self._handle_record_message,
+            MESG_NUM_EVENT: self._handle_event_message,
+            MESG_NUM_CLIMB_PRO: self._handle_climb_message,
+            MESG_NUM_JUMP: self._handle_jump_message,
 
             # TBD messages:
             # - segment_lap
@@ -183,10 +306,17 @@ class Reader:
             # - timestamp_correlation
             # - device_info
             # - device_aux_battery_info
+        }
+
+        def mesg_listener(mesg_num: int, message: dict) -> None:
+            handler = handlers.get(mesg_num)
+            if handler is not None:
+                handler(message)
+
         try:
             stream = Stream.from_file(self.fit_file)
             decoder = Decoder(stream)
-            _, errors = decoder.read(mesg_listener=mesg_listener)
+            errors = decode(decoder, mesg_listener, convert_datetimes=False)
 
             if errors:
                 logging.error(f"Errors decoding fit file:")
@@ -201,9 +331,9 @@ class Reader:
 
     def _handle_session_message(self, message: dict) -> None:
         if 'timestamp' in message:
-            self._metadata['end_time'] = message['timestamp']
+            self._metadata['end_time'] = convert_timestamp_to_datetime(message['timestamp'])
         if 'start_time' in message:
-            self._metadata['start_time'] = message['start_time']
+            self._metadata['start_time'] = convert_timestamp_to_datetime(message['start_time'])
         if 'start_position_lat' in message:
             self._metadata['start_position_lat'] = message['start_position_lat'] * SEMICIRCLES_FACTOR
         if 'start_position_long' in message:
@@ -373,75 +503,11 @@ class Reader:
             return
         
         timestamp = message['timestamp']
-        if timestamp not in self._data:
-            self._data[timestamp] = {}
+        row = self._row(timestamp)
 
-        record_data = {}
+        self._stage(row, 'timestamp', timestamp)
 
-        record_data['timestamp'] = timestamp
-        
-        if 'position_lat' in message:
-            record_data['position_lat'] = message['position_lat'] * SEMICIRCLES_FACTOR
-        if 'position_long' in message:
-            record_data['position_long'] = message['position_long'] * SEMICIRCLES_FACTOR
-
-        if 'enhanced_altitude' in message:
-            record_data['altitude'] = message['enhanced_altitude']
-        elif 'altitude' in message:
-            record_data['altitude'] = message['altitude']
-
-        if 'heart_rate' in message:
-            record_data['heart_rate'] = message['heart_rate']
-        if 'cadence' in message:
-            record_data['cadence'] = message['cadence']
-        if 'distance' in message:
-            record_data['distance'] = message['distance']
-
-        if 'enhanced_speed' in message:
-            record_data['speed'] = message['enhanced_speed']
-        elif 'speed' in message:
-            record_data['speed'] = message['speed']
-
-        if 'power' in message:
-            record_data['power'] = message['power']
-        if 'grade' in message:
-            record_data['grade'] = message['grade']
-        if 'temperature' in message:
-            record_data['temperature'] = message['temperature']
-        if 'accumulated_power' in message:
-            record_data['accumulated_power'] = message['accumulated_power']
-        if 'left_right_balance' in message:
-            record_data['left_right_balance'] = message['left_right_balance']
-        if 'gps_accuracy' in message:
-            record_data['gps_accuracy'] = message['gps_accuracy']
-        if 'vertical_speed' in message:
-            record_data['vertical_speed'] = message['vertical_speed']
-        if 'calories' in message:
-            record_data['calories'] = message['calories']
-        if 'left_torque_effectiveness' in message:
-            record_data['left_torque_effectiveness'] = message['left_torque_effectiveness']
-        if 'right_torque_effectiveness' in message:
-            record_data['right_torque_effectiveness'] = message['right_torque_effectiveness']
-        if 'left_pedal_smoothness' in message:
-            record_data['left_pedal_smoothness'] = message['left_pedal_smoothness']
-        if 'right_pedal_smoothness' in message:
-            record_data['right_pedal_smoothness'] = message['right_pedal_smoothness']
-        if 'combined_pedal_smoothness' in message:
-            record_data['combined_pedal_smoothness'] = message['combined_pedal_smoothness']
-        if 'enhanced_respiration_rate' in message:
-            record_data['respiration_rate'] = message['enhanced_respiration_rate']
-        if 'grit' in message:
-            record_data['grit'] = message['grit']
-        if 'flow' in message:
-            record_data['flow'] = message['flow']
-        if 'core_temperature' in message:
-            record_data['core_temperature'] = message['core_temperature']
-
-        self._data[timestamp].update(record_data)
-
-        for key,value in self._cache.items():
-            if key not in self._data[timestamp]:
-                self._data[timestamp][key] = value
+        stage_record_fields(message, row, self._staged)
 
 
     def _handle_event_message(self, message: dict) -> None:
@@ -456,8 +522,7 @@ class Reader:
             return
 
         timestamp = message['timestamp']
-        if timestamp not in self._data:
-            self._data[timestamp] = {}
+        self._row(timestamp)
 
         data = {}
         if message['event'] == 'front_gear_change' and message['event_type'] == 'marker':
@@ -478,8 +543,8 @@ class Reader:
             if isinstance(rear_gear, int) and 0 < rear_gear < 255:
                 data['rear_gear'] = rear_gear
 
-        self._data[timestamp].update(data)
-        self._cache.update(data)
+        if data:
+            self._changes.append((timestamp, data))
 
 
     def _handle_climb_message(self, message: dict) -> None:
@@ -494,26 +559,21 @@ class Reader:
             return
 
         timestamp = message['timestamp']
-        if timestamp not in self._data:
-            self._data[timestamp] = {}
+        self._row(timestamp)
 
         if message['climb_pro_event'] == 'start':
             climb = message['climb_number']
 
-            self._data[timestamp]['active_climb'] = climb
             self._cache['active_climb'] = climb
+            self._changes.append((timestamp, {'active_climb': climb}))
         elif message['climb_pro_event'] == 'complete':
             if 'active_climb' not in self._cache:
                 logging.info('Received climb_pro complete event without climb_pro start event. Updating climb active from start.')
-                climb = message['climb_number']
-                for t,r in self.data:
-                    if t < timestamp:
-                        r['active_climb'] = climb
+                self._climb_backfills.append((timestamp, message['climb_number']))
 
-            if 'active_climb' in self._data[timestamp]:
-                del self._data[timestamp]['active_climb']
             if 'active_climb' in self._cache:
                 del self._cache['active_climb']
+            self._changes.append((timestamp, {'active_climb': None}))
 
 
     def _handle_jump_message(self, message: dict) -> None:
@@ -522,8 +582,7 @@ class Reader:
             return
 
         timestamp = message['timestamp']
-        if timestamp not in self._data:
-            self._data[timestamp] = {}
+        row = self._row(timestamp)
 
         data = {}
 
@@ -538,210 +597,242 @@ class Reader:
         if 'score' in message and isinstance(message['score'], (int, float)) and not math.isnan(message['score']):
             data['jump_score'] = message['score']
 
-        self._data[timestamp].update(data)
+        for field, value in data.items():
+            self._stage(row, field, value)
 
 
-    def _generate_calculated_fields(self) -> None:
-        self._calculate_bounds()
-        self._calculate_activity_time()
-        self._calculate_distance()
-        self._calculate_smooth_altitude()
-        self._calculate_speed()
-        self._calculate_power_rolling_averages()
-        self._calculate_grade()
-        self._calculate_vertical_speed()
+    def _row(self, timestamp: int) -> int:
+        return self._rows.setdefault(timestamp, len(self._rows))
 
 
-    def _calculate_bounds(self) -> None:
-        if set(['minlat', 'minlon', 'maxlat', 'maxlon']).issubset(self._metadata.keys()):
-            return
+    def _stage(self, row: int, field: str, value: object) -> None:
+        rows, values = self._staged.setdefault(field, ([], []))
+        rows.append(row)
+        values.append(value)
 
-        logging.debug("Calculating bounds")
 
-        lats = []
-        lons = []
+    def _build_columns(self) -> None:
+        logging.debug("Building data columns")
 
-        for timestamp,record in self.data:
-            if 'position_lat' in record:
-                lats.append(record['position_lat'])
-            if 'position_long' in record:
-                lons.append(record['position_long'])
+        timestamps = sorted(self._rows)
+        count = len(timestamps)
 
-        if len(lats) > 0 and len(lons) > 0:
-            self._metadata['minlat'] = min(lats)
-            self._metadata['maxlat'] = max(lats)
-            self._metadata['minlon'] = min(lons)
-            self._metadata['maxlon'] = max(lons)
+        position = np.empty(count, dtype=np.int64)
+        position[[self._rows[timestamp] for timestamp in timestamps]] = np.arange(count)
 
+        for field, (rows, values) in self._staged.items():
+            if not rows:
+                continue
 
-    def _calculate_activity_time(self) -> None:
-        logging.debug("Calculating activity time")
+            positions = position[rows]
+            valid = np.zeros(count, dtype=bool)
+            valid[positions] = True
 
-        start_time = None
-        for timestamp,record in self.data:
-            if start_time is None:
-                start_time = timestamp
+            staged_values = np.asarray(values)
+            if np.count_nonzero(valid) < len(positions): # timestamp repeated across messages - last value wins
+                _, last = np.unique(positions[::-1], return_index=True)
+                keep = len(positions) - 1 - last
+                positions, staged_values = positions[keep], staged_values[keep]
 
-            record['time'] = (timestamp - start_time).total_seconds()
+            staged_values = self._narrow(field, staged_values)
+            column = np.zeros(count, dtype=staged_values.dtype)
+            column[positions] = staged_values
+            self._set_column(field, column, valid)
 
+        for field in semicircles_fields:
+            if field in self._cols:
+                self._cols[field] = self._cols[field].astype(np.float64) * SEMICIRCLES_FACTOR
 
-    def _calculate_distance(self) -> None:
-        logging.debug("Calculating distance")
+        self._fill_climb_backfills(timestamps)
+        self._fill_changes(timestamps)
 
-        last_lat = None
-        last_lon = None
-        total_distance = 0.0
+        self._timestamps = np.array(timestamps, dtype=np.int64)
 
-        for timestamp,record in self.data:
-            if 'position_lat' in record and 'position_long' in record:
-                lat = record['position_lat']
-                lon = record['position_long']
+        self._rows = {}
+        self._staged = {}
 
-                if last_lat is not None and last_lon is not None:
-                    total_distance += geo_distance(last_lat, last_lon, lat, lon)
 
-                last_lat = lat
-                last_lon = lon
+    @staticmethod
+    def _narrow(field: str, values: np.ndarray) -> np.ndarray:
+        dtype = column_dtypes.get(field)
+        if dtype is None or values.dtype.kind not in 'iu' or len(values) == 0:
+            return values
 
-            record['track_distance'] = total_distance
-            if 'distance' not in record:
-                record['distance'] = total_distance
+        limits = np.iinfo(dtype)
+        if values.min() < limits.min or values.max() > limits.max:
+            logging.debug("Values of %s field out of %s range, keeping %s.", field, np.dtype(dtype).name, values.dtype.name)
+            return values
+        return values.astype(dtype)
 
 
-    def _calculate_smooth_altitude(self) -> None:
-        logging.debug("Calculating smooth altitude")
+    def _fill_climb_backfills(self, timestamps: list[int]) -> None:
+        count = len(timestamps)
 
-        for record, window in self._sliding_window(SMOOTH_ALTITUDE_TIME_WINDOW, 'time'):
-            altitudes = [r['altitude'] for r in window if 'altitude' in r]
-            if len(altitudes) > 0:
-                record['smooth_altitude'] = statistics.mean(altitudes)
+        for timestamp, climb in self._climb_backfills:
+            if 'active_climb' not in self._cols:
+                self._set_column('active_climb', np.zeros(count, dtype=column_dtypes['active_climb']), np.zeros(count, dtype=bool))
 
+            end = bisect.bisect_left(timestamps, timestamp)
+            self._cols['active_climb'][:end] = climb
+            self._valid['active_climb'][:end] = True
 
-    def _calculate_speed(self) -> None:
-        logging.debug("Calculating speed")
 
-        last_time = None
-        last_distance = None
+    def _fill_changes(self, timestamps: list[int]) -> None:
+        # every change applies from its timestamp until the next change of the same field
+        changes: dict[str, list[tuple[int, object]]] = {}
+        for timestamp, data in self._changes:
+            start = bisect.bisect_left(timestamps, timestamp)
+            for field, value in data.items():
+                changes.setdefault(field, []).append((start, value))
 
-        for timestamp,record in self.data:
-            if 'distance' in record and 'time' in record:
-                distance = record['distance']
-                time = record['time']
+        count = len(timestamps)
+        for field, field_changes in changes.items():
+            if field not in self._cols:
+                if all(value is None for _, value in field_changes):
+                    continue # never set - nothing to fill
+                self._set_column(field, np.zeros(count, dtype=column_dtypes[field]), np.zeros(count, dtype=bool))
 
-                if last_time is not None and last_distance is not None:
-                    time_delta = time - last_time
-                    if time_delta > 0:
-                        speed = (distance - last_distance) / time_delta
-                        record['track_speed'] = speed
-                        if 'speed' not in record:
-                            record['speed'] = speed
+            values, valid = self._cols[field], self._valid[field]
+            filled = np.zeros(len(values), dtype=values.dtype)
+            filled_valid = np.zeros(len(values), dtype=bool)
 
-                last_time = time
-                last_distance = distance
+            ends = [start for start, _ in field_changes[1:]] + [len(values)]
+            for (start, value), end in zip(field_changes, ends):
+                if value is not None:
+                    filled[start:end] = value
+                    filled_valid[start:end] = True
 
+            fill = filled_valid & ~valid
+            self._set_column(field, np.where(fill, filled, values), valid | fill)
 
-    def _calculate_power_rolling_averages(self) -> None:
-        logging.debug("Calculating power rolling averages (3s, 10s, 30s)")
 
-        power = {}
-        for timestamp,record in self.data:
-            if 'power' in  record:
-                power[timestamp] = record['power']
+    def _column(self, field: str) -> tuple[np.ndarray, np.ndarray]:
+        if field in self._cols:
+            return self._cols[field], self._valid[field]
 
-            power3s = [p[1] for p in power.items() if p[0] > timestamp - timedelta(seconds=3)]
-            power10s = [p[1] for p in power.items() if p[0] > timestamp - timedelta(seconds=10)]
-            power30s = [p[1] for p in power.items() if p[0] > timestamp - timedelta(seconds=30)]
-            if len(power3s) > 0:
-                record['power3s'] = statistics.mean(power3s)
-            if len(power10s) > 0:
-                record['power10s'] = statistics.mean(power10s)
-            if len(power30s) > 0:
-                record['power30s'] = statistics.mean(power30s)
+        count = len(self._timestamps)
+        return np.zeros(count, dtype=np.float64), np.zeros(count, dtype=bool)
 
-            power = {k: v for k, v in power.items() if k > timestamp - timedelta(seconds=30)}
 
+    def _set_column(self, field: str, values: np.ndarray, valid: np.ndarray) -> None:
+        self._cols[field] = values
+        self._valid[field] = valid
 
-    def _calculate_grade(self) -> None:
-        logging.debug("Calculating grade")
 
-        alt_key = 'smooth_altitude'
-        dist_key = 'distance'
+    def _generate_calculated_fields(self) -> None:
+        if len(self._timestamps) == 0:
+            return
 
-        for record, window in self._sliding_window(MAX_GRADE_WINDOW, dist_key):
-            dist = record.get(dist_key, None)
-            alt = record.get(alt_key, None)
-            if dist is None or alt is None:
-                continue
+        self._calculate_bounds()
+        self._calculate_time_distance_speed()
+        self._calculate_smooth_altitude()
+        self._calculate_power_rolling_averages()
+        self._calculate_grade()
 
-            altitudes = [(r[dist_key], r[alt_key]) for r in window if alt_key in r and dist_key in r]
-            z1,y1 = altitudes[0]
-            z2,y2 = altitudes[-1]
 
-            if dist - z1 < MIN_GRADE_WINDOW/2:
-                continue # don't calculate grade - covers beginning of activity
-            if z2 - dist < MIN_GRADE_WINDOW/2:
-                continue # don't calculate grade - covers end of activity
+    def _calculate_bounds(self) -> None:
+        if set(['minlat', 'minlon', 'maxlat', 'maxlon']).issubset(self._metadata.keys()):
+            return
 
-            z = z2 - z1
-            y = y2 - y1
+        logging.debug("Calculating bounds")
 
-            x = math.sqrt(z**2 - y**2) # pythagoras (x**2 + y**2 = z**2 where z is distance delta and y is altitude delta)
+        lat, lat_valid = self._column('position_lat')
+        lon, lon_valid = self._column('position_long')
 
-            record['grade'] = (y / x) * 100.0
+        if lat_valid.any() and lon_valid.any():
+            self._metadata['minlat'] = float(lat[lat_valid].min())
+            self._metadata['maxlat'] = float(lat[lat_valid].max())
+            self._metadata['minlon'] = float(lon[lon_valid].min())
+            self._metadata['maxlon'] = float(lon[lon_valid].max())
 
 
-    def _calculate_vertical_speed(self) -> None:
-        logging.debug("Calculating vertical speed")
+    def _calculate_time_distance_speed(self) -> None:
+        from . import _kernels
 
-        last_time = None
-        last_altitude = None
+        logging.debug("Calculating activity time, distance, speed and vertical speed")
 
-        for timestamp,record in self.data:
-            if 'altitude' in record and 'time' in record:
-                altitude = record['altitude']
-                time = record['time']
+        time = (self._timestamps - self._timestamps[0]).astype(np.float64)
 
-                if 'vertical_speed' not in record and last_time is not None and last_altitude is not None:
-                    time_delta = time - last_time
-                    if time_delta > 0:
-                        vertical_speed = (altitude - last_altitude) / time_delta
-                        record['vertical_speed'] = vertical_speed
+        lat, lat_valid = self._column('position_lat')
+        lon, lon_valid = self._column('position_long')
+        distance, distance_valid = self._column('distance')
+        altitude, altitude_valid = self._column('altitude')
+        speed, speed_valid = self._column('speed')
+        vertical_speed, vertical_speed_valid = self._column('vertical_speed')
 
-                last_time = time
-                last_altitude = altitude
+        track_distance = _kernels.track_distance(lat.astype(np.float64), lon.astype(np.float64), lat_valid & lon_valid)
+        distance = np.where(distance_valid, distance, track_distance)
 
+        track_speed, track_speed_valid, calculated_vertical_speed, calculated_vertical_speed_valid = \
+            _kernels.speeds(time, distance, altitude.astype(np.float64), altitude_valid)
 
-    def _sliding_window(self, window_size: float, key: str) -> Generator[tuple[dict, list[dict]], None, None]:
-        def in_window(record: dict, target: float) -> bool:
-            value = record.get(key, None)
-            if value is None:
-                return False
-            delta: float = abs(value - target)
-            return delta <= (window_size / 2.0)
+        all_valid = np.ones(len(time), dtype=bool)
+        self._set_column('time', time, all_valid)
+        self._set_column('track_distance', track_distance, all_valid)
+        self._set_column('distance', distance, all_valid)
 
-        seq = [record for _,record in self.data]
+        fill = track_speed_valid & ~speed_valid
+        self._set_column('track_speed', track_speed, track_speed_valid)
+        self._set_column('speed', np.where(fill, track_speed, speed.astype(np.float64)), speed_valid | fill)
 
-        for i, cur in enumerate(seq):
-            value = cur.get(key, None)
-            if value is None:
-                logging.warning(f"Record without {key} field in sliding window calculation. Skipping.")
-                continue
+        fill = calculated_vertical_speed_valid & ~vertical_speed_valid
+        self._set_column('vertical_speed', np.where(fill, calculated_vertical_speed, vertical_speed.astype(np.float64)), vertical_speed_valid | fill)
+
+
+    def _calculate_smooth_altitude(self) -> None:
+        from . import _kernels
+
+        logging.debug("Calculating smooth altitude")
+
+        altitude, altitude_valid = self._column('altitude')
+        lo, hi = self._sliding_window(SMOOTH_ALTITUDE_TIME_WINDOW, 'time')
+
+        smooth_altitude, smooth_altitude_valid = _kernels.window_mean(altitude.astype(np.float64), altitude_valid, lo, hi)
+
+        self._set_column('smooth_altitude', smooth_altitude, smooth_altitude_valid)
+
+
+    def _calculate_power_rolling_averages(self) -> None:
+        from . import _kernels
+
+        logging.debug("Calculating power rolling averages (3s, 10s, 30s)")
+
+        power, power_valid = self._column('power')
+        time = self._cols['time']
+
+        windows = (3, 10, 30)
+        averages = _kernels.rolling_means(time, power, power_valid, windows)
+
+        for seconds, (average, average_valid) in zip(windows, averages):
+            self._set_column(f'power{seconds}s', average, average_valid)
+
+
+    def _calculate_grade(self) -> None:
+        from . import _kernels
+
+        logging.debug("Calculating grade")
+
+        distance, distance_valid = self._column('distance')
+        altitude, altitude_valid = self._column('smooth_altitude')
+        grade, grade_valid = self._column('grade')
+
+        lo, hi = self._sliding_window(MAX_GRADE_WINDOW, 'distance')
+        calculated, calculated_valid = _kernels.grade(distance.astype(np.float64), altitude, distance_valid & altitude_valid,
+                                                      lo, hi, MIN_GRADE_WINDOW)
+
+        self._set_column('grade', np.where(calculated_valid, calculated, grade.astype(np.float64)), grade_valid | calculated_valid)
 
-            # backward until condition fails
-            left = []
-            j = i - 1
-            while j >= 0 and in_window(seq[j], value):
-                left.append(seq[j])
-                j -= 1
-            left.reverse()
 
-            # forward until condition fails
-            right = []
-            k = i + 1
-            while k < len(seq) and in_window(seq[k], value):
-                right.append(seq[k])
-                k += 1
+    def _sliding_window(self, window_size: float, key: str) -> tuple[np.ndarray, np.ndarray]:
+        from . import _kernels
 
-            yield cur, left + [cur] + right
+        values, valid = self._column(key)
 
+        values = values.astype(np.float64)
+        missing = len(valid) - np.count_nonzero(valid)
+        if missing == 0 and np.all(np.diff(values) >= 0):
+            return _kernels.centered_window_bounds(values, window_size)
 
+        if missing > 0:
+            logging.warning("%d records without %s field in sliding window calculation. Skipping.", missing, key)
+        return _kernels.window_bounds(values, valid, window_size)
@@ -4,6 +4,7 @@ import logging
 from garmin_fit_sdk import Decoder, Stream
 
 from ._tool_descriptor import Tool
+from .utils.decode import decode
 
 
 def main(fit_file: str) -> bool:
@@ -17,7 +18,7 @@ def main(fit_file: str) -> bool:
             logging.error("Fit file integrity check failed.")
             return False
 
-        _, errors = decoder.read()
+        errors = decode(decoder)
 
         if errors:
             logging.error(f"Fit file verification failed with {len(errors)} errors:")
@@ -0,0 +1,184 @@
+import math
+import pytest
+from pathlib import Path
+from fitt.tools.utils import reader as reader_module
+from fitt.tools.utils.reader import Reader, MESG_NUM_RECORD, MESG_NUM_EVENT, MESG_NUM_CLIMB_PRO, MAX_GRADE_WINDOW, MIN_GRADE_WINDOW
+
+@pytest.fixture
+def test_data_dir():
+    return Path(__file__).parent / "data"
+
+
+@pytest.fixture
+def sample_fit_file(test_data_dir):
+    path = test_data_dir / "sample.fit"
+    if not path.exists():
+        pytest.skip(f"Sample FIT file not found: {path}")
+    return str(path)
+
+
+@pytest.fixture
+def invalid_fit_file(test_data_dir):
+    path = test_data_dir / "invalid.fit"
+    if not path.exists():
+        pytest.skip(f"Invalid FIT file not found: {path}")
+    return str(path)
+
+
+@pytest.fixture
+def synthetic_reader(sample_fit_file, monkeypatch):
+    # reader fed with given (mesg_num, message) list instead of decoded fit file messages
+    def read(messages):
+        def decode(decoder, mesg_listener=None, convert_datetimes=True):
+            for mesg_num, message in messages:
+                mesg_listener(mesg_num, dict(message))
+            return []
+
+        monkeypatch.setattr(reader_module, 'decode', decode)
+        return Reader(sample_fit_file)
+    return read
+
+
+def test_reader_with_valid_fit_file(sample_fit_file):
+    reader = Reader(sample_fit_file)
+    assert reader.ok is True, "Reader should succeed for a valid FIT file."
+
+    records = list(reader.data)
+    assert len(records) > 0, "Reader should provide records for a valid FIT file."
+
+    timestamps = [timestamp for timestamp, _ in records]
+    assert timestamps == sorted(timestamps), "Records should be provided in timestamp order."
+
+
+def test_reader_with_invalid_fit_file(invalid_fit_file):
+    reader = Reader(invalid_fit_file)
+    assert reader.ok is False, "Reader should fail for an invalid FIT file."
+    assert list(reader.data) == [], "Reader should not provide records for an invalid FIT file."
+
+
+def test_reader_calculated_fields(sample_fit_file):
+    reader = Reader(sample_fit_file)
+    records = [record for _, record in reader.data]
+
+    assert records[0]['time'] == 0.0, "Activity time should start at zero."
+    assert all('track_distance' in r and 'distance' in r for r in records), "Every record should have distance."
+    assert all(a['track_distance'] <= b['track_distance'] for a, b in zip(records, records[1:])), "Track distance should be non-decreasing."
+    assert any('power3s' in r for r in records), "Power rolling averages should be calculated."
+    assert any('grade' in r for r in records), "Grade should be calculated."
+
+
+def test_reader_record_values_are_python_types(sample_fit_file):
+    reader = Reader(sample_fit_file)
+    _, record = next(iter(reader.data))
+
+    for field, value in record.items():
+        assert type(value).__module__ == 'builtins' or field == 'timestamp', f"Field '{field}' should not expose numpy types."
+
+
+def test_reader_without_altitude(synthetic_reader):
+    messages = [(MESG_NUM_RECORD, {'timestamp': 1000 + i, 'distance': 10.0 * i, 'power': 200}) for i in range(10)]
+    reader = synthetic_reader(messages)
+    records = [record for _, record in reader.data]
+
+    assert len(records) == 10, "Reader should provide all records without altitude."
+    assert not any('grade' in r or 'smooth_altitude' in r for r in records), "Grade should not be calculated without altitude."
+    assert records[-1]['power3s'] == 200.0, "Power rolling averages should be calculated without altitude."
+
+
+def test_reader_with_event_rows_only(synthetic_reader):
+    messages = [(MESG_NUM_EVENT, {'timestamp': 1000 + i, 'event': 'rear_gear_change', 'event_type': 'marker', 'rear_gear_num': 1 + i, 'rear_gear': 20 + i}) for i in range(5)]
+    reader = synthetic_reader(messages)
+    records = [record for _, record in reader.data]
+
+    assert [r['rear_gear_num'] for r in records] == [1, 2, 3, 4, 5], "Reader should provide rows of event messages."
+    assert not any('grade' in r for r in records), "Grade should not be calculated without altitude."
+
+
+def expected_grades(records):
+    # window expanded outwards from record while distance stays within half of window
+    grades = []
+    for i, record in enumerate(records):
+        in_window = lambda r: abs(r['distance'] - record['distance']) <= MAX_GRADE_WINDOW / 2
+        first = i
+        while first > 0 and in_window(records[first - 1]):
+            first -= 1
+        last = i
+        while last < len(records) - 1 and in_window(records[last + 1]):
+            last += 1
+
+        start, end = records[first], records[last]
+        if record['distance'] - start['distance'] < MIN_GRADE_WINDOW / 2 or end['distance'] - record['distance'] < MIN_GRADE_WINDOW / 2:
+            grades.append(None)
+            continue
+
+        z = end['distance'] - start['distance']
+        y = end['smooth_altitude'] - start['smooth_altitude']
+        grades.append(y / math.sqrt(z**2 - y**2) * 100.0)
+    return grades
+
+
+def test_reader_with_gaps_in_device_distance(synthetic_reader):
+    # track distance filling the gaps makes distance non-monotonic
+    messages = []
+    for i in range(120):
+        message = {'timestamp': 1000 + i, 'position_lat': 500000000 + 600 * i, 'position_long': 200000000, 'altitude': 100.0 + 0.05 * i + (i % 3)}
+        if i % 17 != 0:
+            message['distance'] = 5.0 * i
+        messages.append((MESG_NUM_RECORD, message))
+    reader = synthetic_reader(messages)
+    records = [record for _, record in reader.data]
+
+    assert len(records) == 120, "Reader should provide all records."
+    for i, (record, grade) in enumerate(zip(records, expected_grades(records))):
+        if grade is None:
+            assert 'grade' not in record, f"Grade should not be calculated for record {i}."
+        else:
+            assert record.get('grade') == pytest.approx(grade), f"Grade window of record {i} should only cover records within window."
+
+
+def records_at(timestamps, **fields):
+    return [(MESG_NUM_RECORD, {'timestamp': timestamp, **fields}) for timestamp in timestamps]
+
+
+def test_reader_forward_fills_gear_changes(synthetic_reader):
+    messages = records_at(range(1000, 1010), power=200)
+    messages.insert(3, (MESG_NUM_EVENT, {'timestamp': 1003, 'event': 'rear_gear_change', 'event_type': 'marker', 'rear_gear_num': 5, 'rear_gear': 21}))
+    messages.insert(8, (MESG_NUM_EVENT, {'timestamp': 1007, 'event': 'rear_gear_change', 'event_type': 'marker', 'rear_gear_num': 6, 'rear_gear': 19}))
+    reader = synthetic_reader(messages)
+    records = [record for _, record in reader.data]
+
+    assert [r.get('rear_gear_num') for r in records] == [None] * 3 + [5] * 4 + [6] * 3, "Gear should apply from its change until the next one."
+    assert [r.get('rear_gear') for r in records] == [None] * 3 + [21] * 4 + [19] * 3, "Gear should apply from its change until the next one."
+
+
+def test_reader_forward_fills_active_climb(synthetic_reader):
+    messages = records_at(range(1000, 1010), power=200)
+    messages.append((MESG_NUM_CLIMB_PRO, {'timestamp': 1002, 'climb_pro_event': 'start', 'climb_number': 1}))
+    messages.append((MESG_NUM_CLIMB_PRO, {'timestamp': 1005, 'climb_pro_event': 'complete', 'climb_number': 1}))
+    reader = synthetic_reader(messages)
+    records = [record for _, record in reader.data]
+
+    assert [r.get('active_climb') for r in records] == [None] * 2 + [1] * 3 + [None] * 5, "Climb should be active from its start until its completion."
+
+
+def test_reader_backfills_climb_completed_without_start(synthetic_reader):
+    messages = records_at(range(1000, 1010), power=200)
+    messages.append((MESG_NUM_CLIMB_PRO, {'timestamp': 1004, 'climb_pro_event': 'complete', 'climb_number': 3}))
+    reader = synthetic_reader(messages)
+    records = [record for _, record in reader.data]
+
+    assert [r.get('active_climb') for r in records] == [3] * 4 + [None] * 6, "Climb completed without start should be active from activity start."
+
+
+def test_reader_merges_records_with_same_timestamp(synthetic_reader):
+    messages = records_at([1001], power=300) + records_at([1000], power=200, heart_rate=120) + records_at([1000], power=250, cadence=90)
+    reader = synthetic_reader(messages)
+    records = list(reader.data)
+
+    assert len(records) == 2, "Records with the same timestamp should be merged into one."
+    assert records[0][0] < records[1][0], "Records should be provided in timestamp order."
+
+    merged = records[0][1]
+    assert merged['power'] == 250, "Last value should win for fields repeated in records with the same timestamp."
+    assert merged['heart_rate'] == 120 and merged['cadence'] == 90, "Fields of all records with the same timestamp should be kept."
+    assert records[1][1]['power'] == 300, "Other records should not be affected by merging."